@@ -1,4 +1,3 @@
-from functools import wraps
 import torch.nn as nn
 
 def residual_block(fusion_type: str = "add"):
@@ -11,17 +10,10 @@ def residual_block(fusion_type: str = "add"):
         if not issubclass(cls, nn.Module):
             raise TypeError("残差块装饰器仅支持nn.Module子类")
 
-        # 保存原始__init__方法
-        original_init = cls.__init__
-
-        # 重写__init__方法以注入残差属性
-        @wraps(original_init)
-        def new_init(self, *args, **kwargs):
-            original_init(self, *args, **kwargs)
-            self.residual = True          # 标记为残差块
-            self.fusion_type = fusion_type  # 设置融合方式
-
-        # 替换类的__init__方法
-        cls.__init__ = new_init
+        # 标记直接写在类上：免去包装__init__后每次实例化经过
+        # nn.Module.__setattr__（逐级检查_parameters/_buffers/_modules）的两次慢路径
+        # 解析器按hasattr/getattr查找，类属性同样可见；子类仍可按需覆写
+        cls.residual = True          # 标记为残差块
+        cls.fusion_type = fusion_type  # 设置融合方式
         return cls
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,99 +1,261 @@
-from collections import OrderedDict
+from collections import deque
+from dataclasses import dataclass, field
+import functools
+import sys
 import tomllib
 from torch import nn
 
+
+@functools.lru_cache(maxsize=None)
+def _load_keep(config_path: str) -> tuple:
+    """读取并缓存配置中的属性保留列表，同一路径只解析一次TOML"""
+    with open(config_path, "rb") as f:
+        return tuple(tomllib.load(f)["attributes"]["keep"])
+
+
+@dataclass(slots=True)
+class LayerInfo:
+    """
+    单个模块的解析结果节点
+    __slots__省去每实例__dict__的哈希表开销，字段访问为C级槽位取值；
+    序列化边界通过to_dict()转换为纯dict
+    """
+    layer_name: str
+    layer_type: str
+    attributes: dict
+    children: list = field(default_factory=list)
+    is_residual_block: bool = False
+    residual_connection: dict | None = None
+    # 在ModelParser.__call__扁平视图flat中的自身/父节点下标
+    _idx: int | None = None
+    _parent_idx: int | None = None
+    # 懒加载参数形状所需：对原模块的引用及首次访问后的缓存
+    # 强引用保证解析结果存活期间形状始终可取，不依赖调用方另行持有模型
+    _layer: nn.Module | None = None
+    _parameters: dict | None = None
+
+    @property
+    def parameters(self) -> dict:
+        """
+        参数形状字典（懒加载）
+        多数消费方（树形可视化、残差块统计）从不读取参数形状，
+        首次访问时才遍历named_parameters并缓存
+        """
+        params = self._parameters
+        if params is None:
+            layer = self._layer
+            if layer is None:
+                params = {}
+            else:
+                # 形状存为tuple：torch.Size本身就是tuple子类，转list会多分配一个列表
+                params = {k: tuple(v.shape)
+                          for k, v in layer.named_parameters(recurse=False)}
+            self._parameters = params
+            self._layer = None  # 缓存后释放模块引用
+        return params
+
+    def to_dict(self) -> dict:
+        """转换为纯dict用于序列化（参数形状还原为list以便JSON输出）"""
+        residual_connection = self.residual_connection
+        if residual_connection is not None:
+            residual_connection = dict(residual_connection)
+            adjust = residual_connection.get("adjust_layer")
+            if isinstance(adjust, LayerInfo):
+                residual_connection["adjust_layer"] = adjust.to_dict()
+        return {
+            "layer_name": self.layer_name,
+            "layer_type": self.layer_type,
+            "parameters": {k: list(v) for k, v in self.parameters.items()},
+            "attributes": self.attributes,
+            "is_residual_block": self.is_residual_block,
+            "residual_connection": residual_connection,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
 class ModelParser:
+    # type -> 类名字符串缓存；模型里不同类通常只有几种，省去每个节点的__name__描述符取值
+    _typename_cache: dict = {}
+    # 残差连接元信息的原型；每个残差块copy()一份再覆写，比执行dict字面量字节码更快
+    _RES_PROTO = {
+        "input_source": None,  # 输入来源（如前一层或模块输入）
+        "fusion_type": "add",  # 融合方式（加法、卷积调整等）
+        "adjust_layer": None,  # 若有维度调整层（如1x1卷积），记录其信息
+    }
+
     def __init__(self, config_path) -> None:
-        with open(config_path, "rb") as f:
-            config = tomllib.load(f)
-            self.attributes_keep = config["attributes"]["keep"]
+        self.attributes_keep = _load_keep(config_path)
+        # 单次__call__内的子树缓存: (id(layer), parent_input) -> info
+        self._memo: dict = {}
+        # type -> 该类是否在类层级声明了'residual'，避免对普通层反复触发
+        # nn.Module.__getattr__的异常慢路径
+        self._residual_type_cache: dict[type, bool] = {}
 
-    def __call__(self, model, **kwds) -> OrderedDict:
+    def __call__(self, model, **kwds) -> dict:
+        """
+        解析模型，返回嵌套树及其扁平视图:
+            tree: 嵌套的层级结构（与_parse_layers返回一致）
+            flat: 按解析顺序排列的所有节点，节点内_idx/_parent_idx记录扁平下标
+            residual_indices: 残差块在flat中的下标，消费方无需再遍历树
+        """
         if not isinstance(model, nn.Module):
             raise TypeError("解析器仅支持torch.nn.Module子类")
 
-        return self._parse_layers(model)
+        # 权重共享等场景下同一子模块会被多次引用，单次解析内缓存其结果
+        flat: list[LayerInfo] = []
+        residual_indices: list[int] = []
+        try:
+            tree = self._parse_layers(model, flat=flat,
+                                      residual_indices=residual_indices)
+            return {
+                "tree": tree,
+                "flat": flat,
+                "residual_indices": residual_indices,
+            }
+        finally:
+            self._memo = {}
 
-    def _get_layer_attributes(self, layer) -> OrderedDict:
+    def _get_layer_attributes(self, layer) -> dict:
         """提取模块的关键属性"""
-        attrs = OrderedDict()
+        attrs = {}
+        # __init__里赋值的属性都在实例__dict__中，直接探测即可，
+        # 绕开nn.Module.__getattr__对_parameters/_buffers/_modules的逐级查找
+        instance_dict = layer.__dict__
+        cls = type(layer)
         for attr in self.attributes_keep:
-            if hasattr(layer, attr):
+            if attr in instance_dict:
+                attrs[attr] = instance_dict[attr]
+            elif hasattr(cls, attr):
+                # 少数以property等类级描述符暴露的属性走慢路径
                 attrs[attr] = getattr(layer, attr)
         return attrs
     
-    def _get_layer_info(self, layer, name: str = "root") -> OrderedDict:
-        info = OrderedDict()
-        info["layer_name"] = name
-        info["layer_type"] = layer.__class__.__name__
-        
-        # 记录参数和基础属性（与之前相同）
-        info["parameters"] = {k: list(v.shape) for k, v in layer.named_parameters(recurse=False)}
-        info["attributes"] = self._get_layer_attributes(layer)
-        return info
-    
-    def _parse_residual_layer(self, layer, parent_input=None) -> OrderedDict:
-        """ 
+    def _get_layer_info(self, layer, name: str = "root") -> LayerInfo:
+        cls = type(layer)
+        cache = self._typename_cache
+        # 参数形状由LayerInfo.parameters懒加载，这里只挂上模块引用；
+        # 若序列化端要求list，由LayerInfo.to_dict()做一次性转换
+        return LayerInfo(
+            layer_name=name,
+            layer_type=cache.get(cls) or cache.setdefault(cls, sys.intern(cls.__name__)),
+            attributes=self._get_layer_attributes(layer),
+            _layer=layer,
+        )
+
+    def _parse_residual_layer(self, layer, parent_input=None) -> dict:
+        """
         处理残差连接特殊标记
         假设我们在自定义残差块中添加了'residual'属性用于标识
+        只构造residual_connection元信息；主分支和调整层由_parse_layers的工作栈填充
         """
-        info = OrderedDict()
-        info["is_residual_block"] = True
         # 记录跳跃连接的输入来源和融合方式
-        info["residual_connection"] = {
-            "input_source": parent_input or "block_input",  # 输入来源（如前一层或模块输入）
-            "fusion_type": layer.fusion_type if hasattr(layer, 'fusion_type') else "add",  # 融合方式（加法、卷积调整等）
-            "adjust_layer": None  # 若有维度调整层（如1x1卷积），记录其信息
-        }
-
-        # 解析残差块内部的主分支和调整层
-        main_branch = []
-        adjust_layer = None
-        for child_name, child_module in layer.named_children():
-            if child_name == "adjust":  # 假设调整层命名为'adjust'
-                adjust_layer = self._get_layer_info(child_module, child_name)
-                info["residual_connection"]["adjust_layer"] = adjust_layer
-            else:  # 主分支层
-                main_branch.append(self._get_layer_info(child_module, child_name))
-        info["children"] = main_branch
+        residual_connection = self._RES_PROTO.copy()
+        residual_connection["input_source"] = parent_input or "block_input"
+        residual_connection["fusion_type"] = getattr(layer, 'fusion_type', "add")
+        return residual_connection
 
-        return info
-    
-    def _parse_layers(self, layer, name: str = "root", parent_input=None) -> OrderedDict:
+    def _build_info(self, layer, name: str, parent_input=None) -> LayerInfo:
         """
-        递归解析模块结构，支持残差连接表示
-        parent_input: 记录当前模块的输入来源（用于标记残差连接）
+        构造单个节点的info（不深入子模块，子模块由_parse_layers的工作栈负责填充）
         """
         info = self._get_layer_info(layer, name)
-        
+
         # 处理残差连接特殊标记
         # 假设我们在自定义残差块中添加了'residual'属性用于标识
-        if hasattr(layer, 'residual') and layer.residual:
-            info["is_residual_block"] = True
-            # 记录跳跃连接的输入来源和融合方式
-            info["residual_connection"] = {
-                "input_source": parent_input or "block_input",  # 输入来源（如前一层或模块输入）
-                "fusion_type": layer.fusion_type if hasattr(layer, 'fusion_type') else "add",  # 融合方式（加法、卷积调整等）
-                "adjust_layer": None  # 若有维度调整层（如1x1卷积），记录其信息
-            }
-            # 解析残差块内部的主分支和调整层
-            main_branch = []
-            adjust_layer = None
-            for child_name, child_module in layer.named_children():
-                if child_name == "adjust":  # 假设调整层命名为'adjust'
-                    adjust_layer = self._parse_layers(child_module, child_name, parent_input=parent_input)
-                    info["residual_connection"]["adjust_layer"] = adjust_layer
-                else:  # 主分支层
-                    main_branch.append(self._parse_layers(child_module, child_name, parent_input=name))
-                    # main_branch.append(self._get_layer_info(child_module, child_name, parent_input=name))
-            info["children"] = main_branch
-        else:
-            # 普通模块：递归解析子模块，输入来源为当前模块名称
-            info["children"] = [
-                self._parse_layers(child, child_name, parent_input=name)
-                for child_name, child in layer.named_children()
-            ]
-            info["is_residual_block"] = False
-            info["residual_connection"] = None  # 非残差块无此属性
-            
-        return info
\ No newline at end of file
+        # 先查实例__dict__（一次dict探测），再按类缓存判断类层级是否声明过该属性，
+        # 只有类声明了才走getattr慢路径
+        is_residual = layer.__dict__.get('residual', False)
+        if not is_residual:
+            cls = type(layer)
+            claims = self._residual_type_cache.get(cls)
+            if claims is None:
+                claims = any('residual' in base.__dict__ for base in cls.__mro__)
+                self._residual_type_cache[cls] = claims
+            if claims:
+                is_residual = getattr(layer, 'residual', False)
+        if is_residual:
+            info.is_residual_block = True
+            info.residual_connection = self._parse_residual_layer(layer, parent_input)
+        return info
+
+    def _parse_layers(self, layer, name: str = "root", parent_input=None,
+                      flat: list | None = None,
+                      residual_indices: list | None = None) -> LayerInfo:
+        """
+        迭代解析模块结构，支持残差连接表示
+        使用显式工作栈代替递归，深层模型（如ResNet152）不再逐层消耗Python调用栈
+        parent_input: 记录当前模块的输入来源（用于标记残差连接）
+        flat/residual_indices: 可选的输出列表，解析过程中顺带填充扁平视图，
+        每个节点记录自身与父节点在flat中的下标（_idx/_parent_idx）
+        """
+        root_info: LayerInfo | None = None
+        if flat is None:
+            flat = []
+        # 缓存仅在本次解析内有效，避免id()复用导致的跨模型误命中
+        memo = self._memo = {}
+        # 栈帧: (parent_container, child_key, layer, name, parent_input, parent_idx)
+        # parent_container为None时表示根节点；为list时child_key是预分配槽位下标；
+        # 为dict时child_key是键名。子节点按固定槽位写入嵌套树；同级帧逆序入栈，
+        # 保证弹栈（处理）顺序与_modules注册顺序一致，flat因此呈先序排列
+        # 帧内容异构，放宽元素类型，避免按根帧推断出过窄的deque类型
+        stack: deque[tuple] = deque([(None, None, layer, name, parent_input, None)])
+        while stack:
+            container, key, cur_layer, cur_name, cur_input, parent_idx = stack.pop()
+            # _modules的键是逐次新建的字符串；intern归并重复名称（layer1、conv1等），
+            # 省内存且让后续==比较走指针相等快路径。cur_name会作为parent_input下传，
+            # 故input_source同样受益
+            if type(cur_name) is str:
+                cur_name = sys.intern(cur_name)
+            # 同一模块对象在相同输入来源下的重复引用直接复用已解析的子树
+            # （共享节点只在首次出现时进入flat，_idx/_parent_idx保留首次的值）
+            memo_key = (id(cur_layer), cur_input)
+            cached = memo.get(memo_key)
+            if cached is not None:
+                if container is None:
+                    root_info = cached
+                else:
+                    container[key] = cached
+                continue
+            info = self._build_info(cur_layer, cur_name, cur_input)
+            memo[memo_key] = info
+            idx = len(flat)
+            flat.append(info)
+            info._idx = idx
+            info._parent_idx = parent_idx
+            if residual_indices is not None and info.is_residual_block:
+                residual_indices.append(idx)
+            if container is None:
+                root_info = info
+            else:
+                container[key] = info
+
+            # 直接遍历nn.Module私有的_modules（OrderedDict，各torch版本中实际稳定），
+            # 跳过named_children()的生成器帧和按id去重的seen集合；None值防御性过滤
+            # 主分支列表按_modules大小预分配，单趟扫描分流并按下标定槽，
+            # 避免逐个append的扩容开销；帧先收集再逆序入栈，使同级按注册顺序处理
+            mods = cur_layer._modules
+            main = [None] * len(mods)
+            i = 0
+            pending: list[tuple] = []
+            if info.is_residual_block:
+                for child_name, child in mods.items():
+                    if child is None:
+                        continue
+                    if child_name == "adjust":  # 假设调整层命名为'adjust'
+                        pending.append((info.residual_connection, "adjust_layer",
+                                        child, child_name, cur_input, idx))
+                    else:  # 主分支层
+                        pending.append((main, i, child, child_name, cur_name, idx))
+                        i += 1
+            else:
+                # 普通模块：解析子模块，输入来源为当前模块名称
+                for child_name, child in mods.items():
+                    if child is not None:
+                        pending.append((main, i, child, child_name, cur_name, idx))
+                        i += 1
+            del main[i:]
+            info.children = main
+            stack.extend(reversed(pending))
+
+        assert root_info is not None  # 根帧必然已被处理
+        return root_info
\ No newline at end of file
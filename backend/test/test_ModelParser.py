@@ -1,6 +1,5 @@
 import pytest
 import torch.nn as nn
-from collections import OrderedDict
 from typing import Dict, List
 
 
@@ -8,7 +7,7 @@ from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
-from src.utils.model_parser import ModelParser
+from src.utils.model_parser import LayerInfo, ModelParser
 from src.models.ResNet import ResNet18, ResNet34, ResNet50, ResNet101, ResNet152
 
 # 测试用例中使用的自定义模块
@@ -36,64 +35,48 @@ class ResidualBlock(nn.Module):
             self.adjust = nn.Linear(10, 10)  # 调整层
 
 
-def has_residual_block(ordered_dict: OrderedDict) -> bool:
+def has_residual_block(node: LayerInfo) -> bool:
     """
-    递归检查OrderedDict中是否存在is_residual_block=True的项
-    
+    迭代检查解析树中是否存在is_residual_block=True的节点
+    使用显式栈代替递归，深层模型不会触发RecursionError，且命中即短路
+
     参数:
-        ordered_dict: 可能包含递归结构的OrderedDict
-        
+        node: 解析得到的LayerInfo树根节点
+
     返回:
         bool: 若存在则返回True，否则返回False
     """
-    # 检查当前节点是否有is_residual_block且为True
-    if 'is_residual_block' in ordered_dict and ordered_dict['is_residual_block'] is True:
-        return True
-    
-    # 递归检查子节点（通常在'children'或类似键中）
-    for key, value in ordered_dict.items():
-        # 若子节点是OrderedDict或dict，递归检查
-        if isinstance(value, (OrderedDict, dict)):
-            if has_residual_block(value):
-                return True
-        # 若子节点是列表/元组，遍历其中的每个元素
-        elif isinstance(value, (list, tuple)):
-            for item in value:
-                if isinstance(item, (OrderedDict, dict)) and has_residual_block(item):
-                    return True
-    
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        # 检查当前节点是否为残差块
+        if cur.is_residual_block:
+            return True
+        # 子节点入栈，调整层挂在residual_connection里需单独处理
+        stack.extend(cur.children)
+        residual_connection = cur.residual_connection
+        if residual_connection is not None:
+            adjust = residual_connection.get("adjust_layer")
+            # 精确类型比较是指针比较，热循环里比isinstance的MRO检查更快
+            if type(adjust) is LayerInfo:
+                stack.append(adjust)
     # 所有节点检查完毕仍未找到
     return False
 
 
-def find_all_residual_blocks(od: OrderedDict | Dict) -> List[OrderedDict | Dict]:
+def find_all_residual_blocks(parse_result: Dict) -> List[LayerInfo]:
     """
-    递归查找并收集所有is_residual_block=True的项
-    
+    从ModelParser.__call__返回的扁平视图中收集所有残差块
+    直接按residual_indices索引flat列表，无需再遍历树
+
     参数:
-        od: 可能包含递归结构的OrderedDict或普通字典
-        
+        parse_result: __call__返回的{"tree", "flat", "residual_indices"}字典
+
     返回:
-        list: 所有包含is_residual_block=True的项组成的列表
+        list: 所有is_residual_block=True的节点组成的列表
     """
-    results = []
-    
-    # 检查当前节点是否为残差块
-    if od.get('is_residual_block') is True:
-        results.append(od)
-    
-    # 递归检查子节点
-    for key, value in od.items():
-        # 处理字典类型的子节点
-        if isinstance(value, (OrderedDict, dict)):
-            results.extend(find_all_residual_blocks(value))
-        # 处理列表或元组中的子节点
-        elif isinstance(value, (list, tuple)):
-            for item in value:
-                if isinstance(item, (OrderedDict, dict)):
-                    results.extend(find_all_residual_blocks(item))
-    
-    return results
+    flat = parse_result["flat"]
+    return [flat[i] for i in parse_result["residual_indices"]]
 
 
 @pytest.fixture
@@ -109,10 +92,10 @@ def test_parse_simple_layer(parser):
     result = parser._parse_layers(layer, name="test_layer")
 
     # 基础信息校验
-    assert result["layer_name"] == "test_layer"
-    assert result["layer_type"] == "SimpleLayer"
-    assert result["is_residual_block"] is False
-    assert result["residual_connection"] is None
+    assert result.layer_name == "test_layer"
+    assert result.layer_type == "SimpleLayer"
+    assert result.is_residual_block is False
+    assert result.residual_connection is None
 
     # 参数形状校验
     # pdb.set_trace()
@@ -122,15 +105,15 @@ def test_parse_simple_layer(parser):
     # assert result["parameters"]["fc.weight"] == [20, 10]  # [out, in]
 
     # 属性提取校验（配置中指定保留的属性）
-    assert result["attributes"] == {
+    assert result.attributes == {
         "in_features": 10,
         "out_features": 20
     }
 
     # 子模块校验
-    assert len(result["children"]) == 1
-    assert result["children"][0]["layer_name"] == "fc"
-    assert result["children"][0]["layer_type"] == "Linear"
+    assert len(result.children) == 1
+    assert result.children[0].layer_name == "fc"
+    assert result.children[0].layer_type == "Linear"
 
 
 def test_parse_residual_block(parser):
@@ -140,14 +123,14 @@ def test_parse_residual_block(parser):
 
     # 残差块标识校验
     # pdb.set_trace()
-    assert result["is_residual_block"] is True
-    assert result["residual_connection"]["fusion_type"] == "add"
-    assert result["residual_connection"]["input_source"] == "root" or "block_input" # 父输入为root
-    assert result["residual_connection"]["adjust_layer"] is None
+    assert result.is_residual_block is True
+    assert result.residual_connection["fusion_type"] == "add"
+    assert result.residual_connection["input_source"] == "root" or "block_input" # 父输入为root
+    assert result.residual_connection["adjust_layer"] is None
 
     # 子模块校验（主分支应包含2个子层）
-    assert len(result["children"]) == 2
-    assert [child["layer_name"] for child in result["children"]] == ["main1", "main2"]
+    assert len(result.children) == 2
+    assert [child.layer_name for child in result.children] == ["main1", "main2"]
 
 
 def test_parse_residual_with_adjust(parser):
@@ -156,14 +139,14 @@ def test_parse_residual_with_adjust(parser):
     result = parser._parse_layers(layer, name="residual_with_adjust")
 
     # 调整层校验
-    adjust_info = result["residual_connection"]["adjust_layer"]
+    adjust_info = result.residual_connection["adjust_layer"]
     assert adjust_info is not None
-    assert adjust_info["layer_name"] == "adjust"
-    assert adjust_info["layer_type"] == "Linear"
+    assert adjust_info.layer_name == "adjust"
+    assert adjust_info.layer_type == "Linear"
 
     # 主分支与调整层总数校验
-    assert len(result["children"]) == 2  # main1 + main2
-    assert result["children"][0]["layer_name"] == "main1"
+    assert len(result.children) == 2  # main1 + main2
+    assert result.children[0].layer_name == "main1"
 
 
 def test_attribute_filtering(parser):
@@ -179,8 +162,8 @@ def test_attribute_filtering(parser):
 
     # 只保留配置中指定的属性（此处配置中未包含keep_me，但测试用例中配置可能需要调整）
     # 实际应根据mock_config中的keep列表判断，这里示例中配置未包含keep_me，故attributes应为空
-    assert "keep_me" not in result["attributes"]
-    assert "drop_me" not in result["attributes"]
+    assert "keep_me" not in result.attributes
+    assert "drop_me" not in result.attributes
 
 
 def test_recursive_parsing(parser):
@@ -194,12 +177,12 @@ def test_recursive_parsing(parser):
     result = parser._parse_layers(layer, name="nested")
 
     # 一级子模块校验
-    assert len(result["children"]) == 1
-    assert result["children"][0]["layer_name"] == "block"
+    assert len(result.children) == 1
+    assert result.children[0].layer_name == "block"
 
     # 嵌套残差块校验
-    assert result["children"][0]["is_residual_block"] is True
-    assert len(result["children"][0]["children"]) == 2  # 残差块内的main1和main2
+    assert result.children[0].is_residual_block is True
+    assert len(result.children[0].children) == 2  # 残差块内的main1和main2
 
 
 @pytest.mark.parametrize("model_class, num_res_block", [
@@ -212,8 +195,13 @@ def test_recursive_parsing(parser):
 def test_model_parse(parser, model_class, num_res_block):
     model = model_class()
     result = parser(model)
-    
-    assert has_residual_block(result)
+    tree = result["tree"]
+
+    assert has_residual_block(tree)
     assert len(find_all_residual_blocks(result)) == num_res_block
-    assert result["layer_name"] == "root"
-    assert result["layer_type"] == "ResNet"
\ No newline at end of file
+    assert tree.layer_name == "root"
+    assert tree.layer_type == "ResNet"
+    # 扁平视图与树保持一致：先序排列，根节点位于flat[0]且无父节点
+    assert result["flat"][0] is tree
+    assert result["flat"][1] is tree.children[0]
+    assert tree._parent_idx is None
\ No newline at end of file